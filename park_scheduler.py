@@ -1,9 +1,35 @@
+import gc
+import os
 import pulp
 from datetime import date, timedelta
+from itertools import combinations
 
-def optimize_park_scheduling(days, parks, companies):
+def out_of_window_days(park_indices, days, number_of_days):
     """
-    Optimizes the park schedule based on given constraints and conditions
+    Enumerates, for every unordered pair of parks and every day, the days that are too far apart from it for a ticket window
+
+    Parameters:
+    park_indices (list): List of park indices
+    days (list): List of day indices
+    number_of_days (int): Number of days the ticket bundle is valid
+
+    Yields:
+    tuple: (park 1, park 2, day, list of out of window days)
+    """
+
+    # No day is out of the window of another when the window covers the whole trip
+    if(number_of_days >= len(days)):
+        return
+
+    for p1, p2 in combinations(park_indices, 2):
+        for i1 in range(len(days)):
+            far_days = days[:max(i1 - number_of_days + 1, 0)] + days[i1 + number_of_days:]
+            if(far_days):
+                yield p1, p2, days[i1], far_days
+
+def build_park_scheduling_problem(days, parks, companies):
+    """
+    Builds the park scheduling problem based on given constraints and conditions
 
     Parameters:
     days (list): List of days
@@ -11,93 +37,133 @@ def optimize_park_scheduling(days, parks, companies):
     companies (list): List of dictionaries, where each dictionary represents a park company
     
     Returns:
-    None
+    tuple: The LP problem and the matrix of park schedule variables, indexed by park index and day index
     """
 
+    # Work with day indices internally, the dates are only needed to name constraints
+    day_dates = days
+    day_index = {d: i for i, d in enumerate(day_dates)}
+    days = list(range(len(day_dates)))
+
     # Create a LP problem
     problem = pulp.LpProblem("Park Schedule Optimization", pulp.LpMinimize)
 
-    # Create a list of park names
+    # Create a list of park names and a list of park indices
     park_names = [x["name"] for x in parks]
+    park_indices = list(range(len(parks)))
+
+    # Create a list of indices of parks with preferred days
+    preferred_indices = [i for i, x in enumerate(parks) if x["preferred_days"]]
+
+    # Create a list of demanding park indices
+    demanding_indices = [i for i, x in enumerate(parks) if x["demanding"]]
 
     # Create variables that represent park schedule, 
-    variables = pulp.LpVariable.dicts("park_schedule", (park_names, days), 0, 1, pulp.LpInteger)
+    variables = pulp.LpVariable.matrix("x", (park_indices, days), 0, 1, pulp.LpInteger)
 
-    # Create slack variables for constraints 6, 7 and 8
-    slack_variables_6 = pulp.LpVariable.dicts("slack_6", (park_names), 0, 1, pulp.LpInteger)
-    slack_variables_7 = pulp.LpVariable.dicts("slack_7", (park_names, park_names, days, days), 0, 1, pulp.LpContinuous)
-    slack_variables_8 = pulp.LpVariable.dicts("slack_8", (park_names, park_names, days, days), 0, 1, pulp.LpContinuous)
+    # Create slack variables for constraints 6 and 7, the ones for constraint 8 are created along with its rows
+    slack_variables_6 = pulp.LpVariable.dicts("slack_6", (preferred_indices), 0, 1, pulp.LpInteger)
+    slack_variables_7 = []
+    if(len(demanding_indices) > 1):
+        slack_variables_7 = pulp.LpVariable.matrix("slack_7", (days[:-1]), 0, 1, pulp.LpContinuous)
+    slack_variables_8 = []
 
     # Define penalty values for slack variables
     PENALTY_6 = 10000
     PENALTY_7 = 10000
     PENALTY_8 = 10000
 
-    problem +=  PENALTY_6 * pulp.lpSum([slack_variables_6[p] for p in park_names]) + \
-                PENALTY_7 * pulp.lpSum([slack_variables_7[p1][p2][d1][d2] for p1 in park_names for p2 in park_names for d1 in days for d2 in days]) + \
-                PENALTY_8 * pulp.lpSum([slack_variables_8[p1][p2][d1][d2] for p1 in park_names for p2 in park_names for d1 in days for d2 in days])
+    # Collect the constraints and add them to the problem at once, the park or day index in each name keeps the names unique
+    constraints = []
 
     # Constraint 1: Only one park can be assigned to the same day
     for d in days:
-        problem += pulp.lpSum([variables[p][d] for p in park_names]) <= 1, ("Constraint 1: At maximum one park can be assigned on the same day " + str(d))
+        constraints.append(pulp.LpConstraint(e=pulp.lpSum([variables[p][d] for p in park_indices]), sense=pulp.LpConstraintLE, name="Constraint 1: At maximum one park can be assigned on the same day " + str(day_dates[d]) + " (day " + str(d) + ")", rhs=1))
 
     # Constraint 2: Each park must be assigned to a day
-    for p in park_names:
-        problem += pulp.lpSum([variables[p][d] for d in days]) == 1, ("Constraint 2: Park " + str(p) + " must be assigned to a day.")
+    for p in park_indices:
+        constraints.append(pulp.LpConstraint(e=pulp.lpSum([variables[p][d] for d in days]), sense=pulp.LpConstraintEQ, name="Constraint 2: Park " + str(park_names[p]) + " (park " + str(p) + ") must be assigned to a day.", rhs=1))
 
-    # Constraint 3: Parks that cannot be visited on specific days
-    for p in parks:
-        for d in p["cannot_visit_days"]:
-            problem += variables[p["name"]][d] == 0, ("Constraint 3: Park " + str(p["name"]) + " cannot be visited on the specific day " + str(d))   
+    # Constraints 3 and 5: Parks that cannot be visited or should be avoided on specific days are fixed through the variable bounds
+    for i, p in enumerate(parks):
+        for d in set(p["cannot_visit_days"]) | set(p["days_to_avoid"]):
+            variables[i][day_index[d]].upBound = 0
 
-    # Constraint 4: Parks that must be visited on specific days
-    for p in parks:
+    # Constraint 4: Parks that must be visited on specific days are fixed through the variable bounds
+    for i, p in enumerate(parks):
         if(p["must_visit_day"] != None):
-            problem += variables[p["name"]][p["must_visit_day"]] == 1, ("Constraint 4: Park " + str(p["name"]) + " should be visited on day " + str(p["must_visit_day"]))    
-
-    # Constraint 5: Parks that should be avoided on specific days
-    for p in parks:
-        for d in p["days_to_avoid"]:
-            problem += variables[p["name"]][d] == 0, ("Constraint 5: Park " + str(p["name"]) + " should be avoided on day(s) " + str(d))
+            variables[i][day_index[p["must_visit_day"]]].lowBound = 1
 
     # Constraint 6: Preferred days for visiting a specific park
-    for p in parks: 
-        pulp.lpSum([variables[p["name"]][d] for d in p["preferred_days"]]) + slack_variables_6[p["name"]] == 1, ("Constraint 6: It is preferred to visit park" + str(p["name"]) + " on days " + str(p["preferred_days"]))
+    for i in preferred_indices:
+        p = parks[i]
+        constraints.append(pulp.LpConstraint(e=pulp.lpSum([variables[i][day_index[d]] for d in p["preferred_days"]]) + slack_variables_6[i], sense=pulp.LpConstraintGE, name="Constraint 6: It is preferred to visit park " + str(p["name"]) + " (park " + str(i) + ") on days " + str(p["preferred_days"]), rhs=1))
 
     # Constraint 7: Two demanding parks cannot be assigned on consecutive days
-    for d1 in days[:-1]:
-        for idx, p1 in enumerate(parks[:-1]):
-            if(p1["demanding"]):
-                for p2 in parks[idx+1:]:
-                    if(p2["demanding"]):
-                        d2 = d1 + timedelta(days=1) 
-                        problem += variables[p1["name"]][d1] + variables[p2["name"]][d2] <= 1 + slack_variables_7[p1["name"]][p2["name"]][d1][d2], ("Constraint 7: demanding parks cannot be assigned on consecutive days. Parks " + str(p1["name"]) + " and " + str(p2["name"] + ". Days: " + str(d1) + " and " + str(d2)))
-                        problem += variables[p1["name"]][d2] + variables[p2["name"]][d1] <= 1 + slack_variables_7[p1["name"]][p2["name"]][d1][d2], ("Constraint 7: demanding parks cannot be assigned on consecutive days. Parks " + str(p1["name"]) + " and " + str(p2["name"] + ". Days: " + str(d2) + " and " + str(d1)))
-    
+    # Since a park is visited only once, at most one demanding park may be visited over each pair of consecutive days
+    # With fewer than two demanding parks these rows could never bind, so they are skipped
+    if(len(demanding_indices) > 1):
+        for d in days[:-1]:
+            constraints.append(pulp.LpConstraint(e=pulp.lpSum([variables[p][d] + variables[p][d + 1] for p in demanding_indices]) - slack_variables_7[d], sense=pulp.LpConstraintLE, name="Constraint 7: demanding parks cannot be assigned on consecutive days " + str(day_dates[d]) + " and " + str(day_dates[d + 1]) + " (days " + str(d) + " and " + str(d + 1) + ")", rhs=1))
+
     # Constraint 8: Parks of the same company should be visited within a specific time interval
+    # These pairwise rows make up most of the problem, so they are left unnamed and numbered by PuLP
+    company_to_parks = {c["company"]: [i for i, p in enumerate(parks) if p["company"] == c["company"]] for c in companies}
+    # Only distinct days are compared, so a window shorter than one day behaves like a one day window
+    window = {c["company"]: max(c["number_of_days"], 1) for c in companies}
     for c in companies:
-        for idx, p1 in enumerate(parks[:-1]):
-            if(c["company"] == p1["company"]):
-                for p2 in parks[idx+1:]:
-                    if(c["company"] == p2["company"]):
-                        for idx2, d1 in enumerate(days[:-1]):
-                            for d2 in days[idx2+1:]:
-                                delta = d2 - d1
-                                if(delta.days + 1 > c["number_of_days"]):
-                                    problem += variables[p1["name"]][d1] + variables[p2["name"]][d2] <= 1 + slack_variables_8[p1["name"]][p2["name"]][d1][d2], ("Parks of the same company should be visited within a specific time interval. Parks " + str(p1["name"]) + " and " + str(p2["name"] + ". Days: " + str(d1) + " and " + str(d2)))
-                                    problem += variables[p1["name"]][d2] + variables[p2["name"]][d1] <= 1 + slack_variables_8[p1["name"]][p2["name"]][d2][d1], ("Parks of the same company should be visited within a specific time interval. Parks " + str(p1["name"]) + " and " + str(p2["name"] + ". Days: " + str(d2) + " and " + str(d1)))
+        for p1, p2, d1, far_days in out_of_window_days(company_to_parks[c["company"]], days, window[c["company"]]):
+            slack = pulp.LpVariable("slack_8_%d_%d_%d" % (p1, p2, d1), 0, 1, pulp.LpContinuous)
+            slack_variables_8.append(slack)
+            constraints.append(pulp.LpConstraint(e=variables[p1][d1] + pulp.lpSum([variables[p2][d2] for d2 in far_days]) - slack, sense=pulp.LpConstraintLE, rhs=1))
+
+    problem.extend(constraints)
+
+    # Build the objective function coefficients from the flat lists of slack variables
+    coef = dict.fromkeys(slack_variables_6.values(), PENALTY_6)
+    coef.update(dict.fromkeys(slack_variables_7, PENALTY_7))
+    coef.update(dict.fromkeys(slack_variables_8, PENALTY_8))
+
+    problem.setObjective(pulp.LpAffineExpression(coef))
+
+    return problem, variables
+
+def optimize_park_scheduling(days, parks, companies):
+    """
+    Optimizes the park schedule based on given constraints and conditions
+
+    Parameters:
+    days (list): List of days
+    parks (list): List of dictionaries, where each dictionary represents a park
+    companies (list): List of dictionaries, where each dictionary represents a park company
     
-    # Solve the problem
-    problem.solve(pulp.PULP_CBC_CMD(timeLimit=300))
+    Returns:
+    None
+    """
+
+    # Disable the garbage collector while the many short-lived model objects are allocated
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        problem, variables = build_park_scheduling_problem(days, parks, companies)
+    finally:
+        if(gc_was_enabled):
+            gc.enable()
+
+    # Solve the problem with HiGHS using all available cores, falling back to CBC (with a fixed seed for reproducible runs) when HiGHS is not installed
+    solver = pulp.HiGHS_CMD(timeLimit=300, threads=os.cpu_count(), msg=False, options=["presolve=on", "parallel=on"])
+    if(not solver.available()):
+        solver = pulp.PULP_CBC_CMD(timeLimit=300, threads=os.cpu_count(), msg=False, options=["randomCbcSeed 1"])
+    problem.solve(solver)
 
     # Print the status of the solution
     print("Status:", pulp.LpStatus[problem.status])
     print("Objective function: ", pulp.value(problem.objective))
     # Print the solution if a solution is found
     if(problem.status >= 0):
-        for x in days:
-            for y in parks:
-                value = variables[y["name"]][x].varValue
+        for i, x in enumerate(days):
+            for j, y in enumerate(parks):
+                value = variables[j][i].varValue
                 if(value):
                     print(str(x) + " - " + str(y["name"]))
 